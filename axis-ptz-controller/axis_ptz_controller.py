@@ -11,7 +11,7 @@ import tempfile
 from time import sleep, time
 import traceback
 from types import FrameType
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Optional, Sequence, Union
 
 import numpy as np
 import quaternion
@@ -397,6 +397,33 @@ class AxisPtzController(BaseMQTTPubSub):
             data = content
         return data
 
+    def publish_batch_to_topic(
+        self, topic: str, payloads: Sequence[Union[str, bytes]], qos: int = 0
+    ) -> None:
+        """Publish a batch of payloads to a topic without pausing
+        between messages. QoS 0 is the default since high rate object
+        messages are idempotent and tolerate loss, which avoids
+        per-message broker acknowledgement roundtrips. Payloads encoded
+        to bytes beforehand are published without a further encoding
+        pass.
+
+        Parameters
+        ----------
+        topic: str
+            The MQTT topic
+        payloads: Sequence[Union[str, bytes]]
+            The payloads to publish, in order
+        qos: int
+            The MQTT quality of service to publish with
+
+        Returns
+        -------
+        None
+        """
+        publish = self.client.publish
+        for payload in payloads:
+            publish(topic, payload, qos=qos)
+
     def _config_callback(
         self,
         _client: Union[mqtt.Client, None],
@@ -1,18 +1,20 @@
 from argparse import ArgumentParser
-from datetime import datetime
-import json
 import logging
 import os
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
-from matplotlib import pyplot as plt
+import numpy as np
+import numpy.typing as npt
+import orjson
+import paho.mqtt.client as mqtt
 import pandas as pd
 
 import axis_ptz_controller
 
 HEARTBEAT_INTERVAL = 10
 UPDATE_INTERVAL = 0.01
+BATCH_SIZE = 64
 CAPTURE_INTERVAL = 2
 LEAD_TIME = 0.0
 PAN_GAIN = 0.1
@@ -113,18 +115,18 @@ def get_orientation_msg() -> Dict[Any, Any]:
         The orientation message
     """
     with open("data/orientation_msg_0s.json", "r") as f:
-        msg = json.load(f)
+        msg = orjson.loads(f.read())
     return msg
 
 
-def make_object_msg(track: pd.DataFrame, index: int) -> Dict[Any, Any]:
+def make_object_msg(records: List[Dict[Any, Any]], index: int) -> Dict[Any, Any]:
     """Populate a object message with track data at the specified
     index.
 
     Parameters
     ----------
-    track : pd.DataFrame()
-        The track data
+    records : List[Dict[Any, Any]]
+        The track data as a list of row dictionaries
     index : int
         The index of the track data to use
 
@@ -134,10 +136,90 @@ def make_object_msg(track: pd.DataFrame, index: int) -> Dict[Any, Any]:
         The object message
     """
     msg = {}
-    msg["data"] = track.iloc[index, :].to_dict()
+    msg["data"] = records[index]
     return msg
 
 
+_payload_envelope: Dict[Any, Any] = {}
+
+
+def make_payload_json(
+    controller: axis_ptz_controller.AxisPtzController, data_payload: str
+) -> bytes:
+    """Generate the payload JSON for an object message, caching the
+    constant envelope fields so that only the push timestamp and data
+    payload are updated per message. The payload is encoded to bytes
+    once so the MQTT client does not encode it again on publish.
+
+    Parameters
+    ----------
+    controller : axis_ptz_controller.AxisPtzController
+        The controller used to generate the payload envelope
+    data_payload : str
+        The object message data serialized as JSON
+
+    Returns
+    -------
+    payload_json : bytes
+        The encoded payload JSON
+    """
+    if not _payload_envelope:
+        # Note that the data payload type keys the data payload in the
+        # envelope
+        _payload_envelope.update(
+            orjson.loads(
+                controller.generate_payload_json(
+                    push_timestamp=0,
+                    device_type="TBC",
+                    id_="TBC",
+                    deployment_id="TBC",
+                    current_location="TBC",
+                    status="Debug",
+                    message_type="Event",
+                    model_version="null",
+                    firmware_version="v0.0.0",
+                    data_payload_type="Selected Object",
+                    data_payload="",
+                )
+            )
+        )
+    _payload_envelope["PushTimestamp"] = time.time_ns() // 1_000_000_000
+    _payload_envelope["Selected Object"] = data_payload
+    return orjson.dumps(_payload_envelope)
+
+
+def make_publisher_pool(
+    pool_size: int, hostname: str, mqtt_ip: str
+) -> List[mqtt.Client]:
+    """Construct additional MQTT clients for publishing high rate
+    object messages in parallel, since a single client may not
+    saturate the connection to the broker.
+
+    Note that an MQTT broker must be started manually.
+
+    Parameters
+    ----------
+    pool_size : int
+        The number of clients to construct
+    hostname : str
+        The hostname used to form distinct client identifiers
+    mqtt_ip : str
+        The MQTT broker IP address
+
+    Returns
+    -------
+    pool : List[mqtt.Client]
+        The connected MQTT clients
+    """
+    pool = []
+    for k in range(pool_size):
+        client = mqtt.Client(client_id=f"{hostname}-pub{k}")
+        client.connect(mqtt_ip)
+        client.loop_start()
+        pool.append(client)
+    return pool
+
+
 def read_track_data(track_id: str) -> pd.DataFrame:
     """Read a track file and convert to standard units of measure.
 
@@ -151,17 +233,72 @@ def read_track_data(track_id: str) -> pd.DataFrame:
     track : pd.DataFrame()
         The track data read from the file
     """
-    track = pd.read_csv(f"data/{track_id}-processed-track.csv")
-    track["altitude"] *= 0.3048  # [ft] * [m/ft] = [m]
-    track["horizontal_velocity"] *= (
-        6076.12 / 3600 * 0.3048
-    )  # [nm/h] * [ft/nm] / [s/h] * [m/ft] = [m/s]
-    track["vertical_velocity"] *= 0.3048 / 60  # [ft/s] * [m/ft] / [s/m] = [m/s]
+    # Specify column dtypes to skip inference while parsing
+    track = pd.read_csv(
+        f"data/{track_id}-processed-track.csv",
+        dtype={
+            "ts_entry": "int64",
+            "altitude": "float64",
+            "ts_altitude": "float64",
+            "horizontal_velocity": "float64",
+            "latitude": "float64",
+            "longitude": "float64",
+            "timestamp": "float64",
+            "vertical_velocity": "float64",
+            "track": "float64",
+        },
+    )
+    columns = ["altitude", "horizontal_velocity", "vertical_velocity"]
+    conversions = np.array(
+        [
+            0.3048,  # [ft] * [m/ft] = [m]
+            6076.12 / 3600 * 0.3048,  # [nm/h] * [ft/nm] / [s/h] * [m/ft] = [m/s]
+            0.3048 / 60,  # [ft/s] * [m/ft] / [s/m] = [m/s]
+        ]
+    )
+    values = track[columns].to_numpy(dtype=np.float64)
+    np.multiply(values, conversions, out=values)
+    track[columns] = values
     return track
 
 
+def compute_tick_schedule(
+    ts_arr: npt.NDArray[np.float64], timestamp_c: float, dt_c: float
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """Compute the camera timestamp and track index for every tick
+    required to play out the track, stopping at the first tick that
+    reaches the last track index.
+
+    Parameters
+    ----------
+    ts_arr : npt.NDArray[np.float64]
+        The track timestamps, which increase monotonically
+    timestamp_c : float
+        The camera timestamp at the start of the track
+    dt_c : float
+        The camera update interval [s]
+
+    Returns
+    -------
+    tick_timestamps : npt.NDArray[np.float64]
+        The camera timestamp at each tick
+    tick_indices : npt.NDArray[np.int64]
+        The track index at each tick
+    """
+    # Compute one tick beyond the track duration to absorb rounding
+    n_ticks = int(np.ceil((ts_arr[-1] - timestamp_c) / dt_c)) + 1
+    tick_timestamps = timestamp_c + dt_c * np.arange(1, n_ticks + 1)
+    tick_indices = np.searchsorted(ts_arr, tick_timestamps, side="right") - 1
+
+    # Stop at the first tick reaching the last track index, noting
+    # that the tick indices are nondecreasing
+    stop = int(np.searchsorted(tick_indices, ts_arr.shape[0] - 1)) + 1
+    return tick_timestamps[:stop], tick_indices[:stop]
+
+
 def plot_time_series(ts: pd.DataFrame) -> None:
-    """Plot time series produced by processing messages.
+    """Plot time series produced by processing messages, writing the
+    figure to a file since the non-interactive Agg backend is used.
 
     Parameters
     ----------
@@ -172,45 +309,64 @@ def plot_time_series(ts: pd.DataFrame) -> None:
     -------
     None
     """
+    # Import here so runs that skip plotting avoid the matplotlib
+    # import cost, and use the Agg backend to avoid GUI toolkit
+    # initialization
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    # Extract underlying arrays once, and compute differences with
+    # NumPy to skip index alignment
+    timestamp_c = ts["timestamp_c"].to_numpy()
+    rho_o = ts["rho_o"].to_numpy()
+    tau_o = ts["tau_o"].to_numpy()
+    rho_dot_o = ts["rho_dot_o"].to_numpy()
+    tau_dot_o = ts["tau_dot_o"].to_numpy()
+    rho_c = ts["rho_c"].to_numpy()
+    tau_c = ts["tau_c"].to_numpy()
+    rho_dot_c = ts["rho_dot_c"].to_numpy()
+    tau_dot_c = ts["tau_dot_c"].to_numpy()
 
     # Plot pan angle
     fig, axs = plt.subplots(2, 2, figsize=[12.8, 9.6])
-    axs[0, 0].plot(ts["timestamp_c"], ts["rho_c"] - ts["rho_o"], label="error")
-    axs[0, 0].plot(ts["timestamp_c"], ts["rho_c"], label="camera")
-    axs[0, 0].plot(ts["timestamp_c"], ts["rho_o"], label="object")
+    axs[0, 0].plot(timestamp_c, rho_c - rho_o, label="error")
+    axs[0, 0].plot(timestamp_c, rho_c, label="camera")
+    axs[0, 0].plot(timestamp_c, rho_o, label="object")
     axs[0, 0].legend()
     axs[0, 0].set_title("Camera and Object Pan Angle and Difference")
     axs[0, 0].set_xlabel("Timestamp [s]")
     axs[0, 0].set_ylabel("Pan Angle [deg]")
 
     # Plot tilt angle
-    axs[1, 0].plot(ts["timestamp_c"], ts["tau_c"] - ts["tau_o"], label="error")
-    axs[1, 0].plot(ts["timestamp_c"], ts["tau_c"], label="camera")
-    axs[1, 0].plot(ts["timestamp_c"], ts["tau_o"], label="object")
+    axs[1, 0].plot(timestamp_c, tau_c - tau_o, label="error")
+    axs[1, 0].plot(timestamp_c, tau_c, label="camera")
+    axs[1, 0].plot(timestamp_c, tau_o, label="object")
     axs[1, 0].legend()
     axs[1, 0].set_title("Camera and Object Tilt Angle and Difference")
     axs[1, 0].set_xlabel("Timestamp [s]")
     axs[1, 0].set_ylabel("Tilt Angle [deg]")
 
     # Plot pan angular rate angle
-    axs[0, 1].plot(ts["timestamp_c"], ts["rho_dot_c"] - ts["rho_dot_o"], label="error")
-    axs[0, 1].plot(ts["timestamp_c"], ts["rho_dot_c"], label="camera")
-    axs[0, 1].plot(ts["timestamp_c"], ts["rho_dot_o"], label="object")
+    axs[0, 1].plot(timestamp_c, rho_dot_c - rho_dot_o, label="error")
+    axs[0, 1].plot(timestamp_c, rho_dot_c, label="camera")
+    axs[0, 1].plot(timestamp_c, rho_dot_o, label="object")
     axs[0, 1].legend()
     axs[0, 1].set_title("Camera and Object Pan Angular Rate and Difference")
-    axs[0, 0].set_xlabel("Timestamp [s]")
+    axs[0, 1].set_xlabel("Timestamp [s]")
     axs[0, 1].set_ylabel("Pan Anglular Rate [deg/s]")
 
     # Plot tilt angular rate angle
-    axs[1, 1].plot(ts["timestamp_c"], ts["tau_dot_c"] - ts["tau_dot_o"], label="error")
-    axs[1, 1].plot(ts["timestamp_c"], ts["tau_dot_c"], label="camera")
-    axs[1, 1].plot(ts["timestamp_c"], ts["tau_dot_o"], label="object")
+    axs[1, 1].plot(timestamp_c, tau_dot_c - tau_dot_o, label="error")
+    axs[1, 1].plot(timestamp_c, tau_dot_c, label="camera")
+    axs[1, 1].plot(timestamp_c, tau_dot_o, label="object")
     axs[1, 1].legend()
     axs[1, 1].set_title("Camera and Object Tilt Angular Rate and Difference")
-    axs[0, 0].set_xlabel("Timestamp [s]")
+    axs[1, 1].set_xlabel("Timestamp [s]")
     axs[1, 1].set_ylabel("Tilt Anglular Rate [deg/s]")
 
-    plt.show()
+    fig.savefig("camera-pointing.png")
 
 
 def main() -> None:
@@ -241,11 +397,30 @@ def main() -> None:
         action="store_true",
         help="Use MQTT to process messages",
     )
+    parser.add_argument(
+        "-n",
+        "--no-plot",
+        action="store_true",
+        help="Skip plotting the resulting time series",
+    )
+    parser.add_argument(
+        "-p",
+        "--publisher-pool",
+        type=int,
+        default=1,
+        help="Number of MQTT clients used to publish object messages",
+    )
     args = parser.parse_args()
 
     # Read the track data
     logger.info(f"Reading track for id: {args.track_id}")
     track = read_track_data(args.track_id)
+    records = track.to_dict(orient="records")
+
+    # Serialize every object data payload once so per-tick publishing
+    # only updates the payload envelope
+    if args.use_mqtt:
+        data_payloads = [orjson.dumps(record).decode("utf-8") for record in records]
 
     # Make the controller, subscribe to all topics, and publish, or
     # process, one message to each topic
@@ -259,34 +434,35 @@ def main() -> None:
     config_msg = get_config_msg()
     orientation_msg = get_orientation_msg()
     index = 0
-    object_msg = make_object_msg(track, index)
+    object_msg = make_object_msg(records, index)
+
+    # Pace publishes against a wall-clock deadline, sleeping only when
+    # ahead of schedule to avoid accumulating oversleep
+    t_0 = time.perf_counter()
+    n_publishes = 0
+
+    def pace_publishes() -> None:
+        nonlocal n_publishes
+        n_publishes += 1
+        slack = t_0 + n_publishes * UPDATE_INTERVAL - time.perf_counter()
+        if slack > 0.0:
+            time.sleep(slack)
+
     if controller.use_mqtt:
         logger.info(f"Publishing config msg: {config_msg}")
-        controller.publish_to_topic(controller.config_topic, json.dumps(config_msg))
-        time.sleep(UPDATE_INTERVAL)
+        controller.publish_to_topic(controller.config_topic, orjson.dumps(config_msg))
+        pace_publishes()
 
         logger.info(f"Publishing orientation msg: {orientation_msg}")
         controller.publish_to_topic(
-            controller.orientation_topic, json.dumps(orientation_msg)
+            controller.orientation_topic, orjson.dumps(orientation_msg)
         )
-        time.sleep(UPDATE_INTERVAL)
+        pace_publishes()
 
         logger.info(f"Publishing object msg: {object_msg}")
-        payload_json = controller.generate_payload_json(
-            push_timestamp=int(datetime.utcnow().timestamp()),
-            device_type="TBC",
-            id_="TBC",
-            deployment_id="TBC",
-            current_location="TBC",
-            status="Debug",
-            message_type="Event",
-            model_version="null",
-            firmware_version="v0.0.0",
-            data_payload_type="Selected Object",
-            data_payload=json.dumps(object_msg["data"]),
-        )
+        payload_json = make_payload_json(controller, data_payloads[index])
         controller.publish_to_topic(controller.object_topic, payload_json)
-        time.sleep(UPDATE_INTERVAL)
+        pace_publishes()
 
     else:
         _client = None
@@ -295,66 +471,121 @@ def main() -> None:
         controller._orientation_callback(_client, _userdata, orientation_msg)
         controller._object_callback(_client, _userdata, object_msg)
 
-    # Initialize history for plotting
-    history = {}
-    history["timestamp_c"] = [object_msg["data"]["timestamp"]]
-    history["rho_o"] = [controller.rho_o]
-    history["tau_o"] = [controller.tau_o]
-    history["rho_dot_o"] = [controller.rho_dot_o]
-    history["tau_dot_o"] = [controller.tau_dot_o]
-    history["rho_c"] = [controller.rho_c]
-    history["tau_c"] = [controller.tau_c]
-    history["rho_dot_c"] = [controller.rho_dot_c]
-    history["tau_dot_c"] = [controller.tau_dot_c]
-
-    # Loop in camera time
+    # Initialize preallocated history for plotting, sized by the
+    # number of ticks required to play out the track
+    columns = [
+        "timestamp_c",
+        "rho_o",
+        "tau_o",
+        "rho_dot_o",
+        "tau_dot_o",
+        "rho_c",
+        "tau_c",
+        "rho_dot_c",
+        "tau_dot_c",
+    ]
     dt_c = controller.update_interval
-    timestamp_c = history["timestamp_c"][0]
-    while index < track.shape[0] - 1:
-        timestamp_c += dt_c
+    timestamp_c = object_msg["data"]["timestamp"]
+    ts_arr = track["timestamp"].to_numpy()
+    n_rows = int(np.ceil((ts_arr[-1] - timestamp_c) / dt_c)) + 2
+    history = np.empty((n_rows, 9))
+    history[0, :] = (
+        timestamp_c,
+        controller.rho_o,
+        controller.tau_o,
+        controller.rho_dot_o,
+        controller.tau_dot_o,
+        controller.rho_c,
+        controller.tau_c,
+        controller.rho_dot_c,
+        controller.tau_dot_c,
+    )
+    i = 1
+
+    # Loop in camera time over the precomputed tick schedule, batching
+    # object message publishes
+    tick_timestamps, tick_indices = compute_tick_schedule(ts_arr, timestamp_c, dt_c)
+    pending: List[bytes] = []
+
+    # Bind frequently accessed attributes to locals for the hot loop
+    use_mqtt = controller.use_mqtt
+    object_topic = controller.object_topic
+    publish_batch_to_topic = controller.publish_batch_to_topic
+    object_callback = controller._object_callback
+    update_pointing = controller._update_pointing
+
+    # Construct additional publishers for the high rate object topic,
+    # if requested, and round-robin batches across them, keeping
+    # config and orientation messages on the controller client
+    pool: List[mqtt.Client] = []
+    if use_mqtt and args.publisher_pool > 1:
+        pool = make_publisher_pool(
+            args.publisher_pool, controller.hostname, os.getenv("MQTT_IP", "")
+        )
+    n_batches = 0
+
+    def publish_object_batch(payloads: List[bytes]) -> None:
+        nonlocal n_batches
+        if pool:
+            client = pool[n_batches % len(pool)]
+            for payload in payloads:
+                client.publish(object_topic, payload, qos=0)
+        else:
+            publish_batch_to_topic(object_topic, payloads)
+        n_batches += 1
+
+    for n in range(tick_timestamps.shape[0]):
+        timestamp_c = tick_timestamps[n]
 
         # Process each object message when received
-        if timestamp_c >= track["timestamp"][index + 1]:
-            index = track["timestamp"][timestamp_c >= track["timestamp"]].index[-1]
-            object_msg = make_object_msg(track, index)
-            if controller.use_mqtt:
-                logger.info(f"Publishing object msg: {object_msg}")
-                payload_json = controller.generate_payload_json(
-                    push_timestamp=int(datetime.utcnow().timestamp()),
-                    device_type="TBC",
-                    id_="TBC",
-                    deployment_id="TBC",
-                    current_location="TBC",
-                    status="Debug",
-                    message_type="Event",
-                    model_version="null",
-                    firmware_version="v0.0.0",
-                    data_payload_type="Selected Object",
-                    data_payload=json.dumps(object_msg["data"]),
-                )
-                controller.publish_to_topic(controller.object_topic, payload_json)
-                time.sleep(UPDATE_INTERVAL)
+        if tick_indices[n] > index:
+            index = int(tick_indices[n])
+            object_msg = make_object_msg(records, index)
+            if use_mqtt:
+                # Defer formatting to the logging framework so the
+                # message dictionary is only rendered when the record
+                # is consumed
+                logger.info("Publishing object msg: %s", object_msg)
+                payload_json = make_payload_json(controller, data_payloads[index])
+                pending.append(payload_json)
+                if len(pending) >= BATCH_SIZE:
+                    publish_object_batch(pending)
+                    pending.clear()
+                pace_publishes()
 
             else:
-                controller._object_callback(_client, _userdata, object_msg)
+                object_callback(_client, _userdata, object_msg)
 
         # Always update pointing
-        controller._update_pointing()
-
-        # Append to history for plotting
-        history["timestamp_c"].append(timestamp_c)
-        history["rho_o"].append(controller.rho_o)
-        history["tau_o"].append(controller.tau_o)
-        history["rho_dot_o"].append(controller.rho_dot_o)
-        history["tau_dot_o"].append(controller.tau_dot_o)
-        history["rho_c"].append(controller.rho_c)
-        history["tau_c"].append(controller.tau_c)
-        history["rho_dot_c"].append(controller.rho_dot_c)
-        history["tau_dot_c"].append(controller.tau_dot_c)
-
-    # Convert history dictionary to a dataframe, and plot
-    ts = pd.DataFrame.from_dict(history)
-    plot_time_series(ts)
+        update_pointing()
+
+        # Write to history for plotting
+        history[i, :] = (
+            timestamp_c,
+            controller.rho_o,
+            controller.tau_o,
+            controller.rho_dot_o,
+            controller.tau_dot_o,
+            controller.rho_c,
+            controller.tau_c,
+            controller.rho_dot_c,
+            controller.tau_dot_c,
+        )
+        i += 1
+
+    # Flush any remaining object messages, and stop the additional
+    # publishers
+    if use_mqtt and pending:
+        publish_object_batch(pending)
+        pending.clear()
+    for client in pool:
+        client.loop_stop()
+        client.disconnect()
+
+    # Convert history array to a dataframe, and plot, if requested
+    ts = pd.DataFrame(history[:i], columns=columns)
+    if not args.no_plot:
+        plot_time_series(ts)
 
 
 if __name__ == "__main__":
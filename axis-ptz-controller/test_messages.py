@@ -186,6 +186,7 @@ def main() -> None:
     # Read the track data
     logger.info(f"Reading track for id: {args.track_id}")
     track = read_track_data(args.track_id)
+    records = track.to_dict(orient="records")
 
     # Make the handler, and subscribe to the logger topic
     logger.info("Making the handler, and subscribing to topics")
@@ -206,7 +207,7 @@ def main() -> None:
     config_msg = get_config_msg()
     orientation_msg = get_orientation_msg()
     index = 0
-    object_msg = make_object_msg(track, index)
+    object_msg = make_object_msg(records, index)
     logger.info(f"Publishing config msg: {config_msg}")
     handler.publish_to_topic(handler.config_topic, json.dumps(config_msg))
     time.sleep(UPDATE_INTERVAL)
@@ -227,8 +228,8 @@ def main() -> None:
         # Process each object message when received
         if time_c >= track["latLonTime"][index + 1]:
             index = track["latLonTime"][time_c >= track["latLonTime"]].index[-1]
-            object_msg = make_object_msg(track, index)
-            logger.info(f"Publishing object msg: {object_msg}")
+            object_msg = make_object_msg(records, index)
+            logger.info("Publishing object msg: %s", object_msg)
             handler.publish_to_topic(handler.object_topic, json.dumps(object_msg))
 
     # Read camera pointing file as a dataframe, and plot